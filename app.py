@@ -1,13 +1,15 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import re
 import dns.resolver
+import dns.exception
 import time
 from io import StringIO, BytesIO
-import base64
 import smtplib
 import socket
-from zipfile import ZipFile
+from zipfile import ZipFile, ZIP_DEFLATED
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # List of common disposable email domains
 DISPOSABLE_DOMAINS = {
@@ -17,184 +19,326 @@ DISPOSABLE_DOMAINS = {
     'grr.la', 'spam4.me', 'emailondeck.com', 'fakeinbox.com'
 }
 
-def validate_email_syntax(email):
-    """Validate email syntax using regex"""
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return re.match(pattern, str(email)) is not None
+# Major providers that accept any recipient at RCPT time, so SMTP checks give no signal
+ALLOWLISTED_DOMAINS = {
+    'gmail.com', 'googlemail.com', 'outlook.com', 'hotmail.com', 'live.com',
+    'msn.com', 'yahoo.com', 'ymail.com', 'aol.com', 'icloud.com', 'me.com',
+    'mac.com', 'protonmail.com', 'proton.me'
+}
+
+def build_domain_trie(domains):
+    """Build a trie of domain labels keyed from the TLD down (com -> mailinator -> $)"""
+    trie = {}
+    for domain in domains:
+        node = trie
+        for label in reversed(domain.split('.')):
+            node = node.setdefault(label, {})
+        node['$'] = True
+    return trie
+
+def matches_domain_trie(domain, trie):
+    """Check if domain, or any parent domain of it, is in the trie"""
+    node = trie
+    for label in reversed(domain.split('.')):
+        node = node.get(label)
+        if node is None:
+            return False
+        if '$' in node:
+            return True
+    return False
+
+# Reversed-label trie so subdomains of disposable providers are caught too
+DISPOSABLE_TRIE = build_domain_trie(DISPOSABLE_DOMAINS)
+
+# Compiled once at import instead of on every call
+EMAIL_RE = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
 
-def check_mx_record(domain):
-    """Check if domain has MX records"""
+# Shared DNS resolver with an in-memory cache so repeat domains are answered locally
+RESOLVER = dns.resolver.Resolver()
+RESOLVER.cache = dns.resolver.LRUCache(max_size=100000)
+RESOLVER.lifetime = 2.0  # Per-lookup timeout, so one dead domain can't stall the run
+
+def lookup_mx(domain):
+    """
+    Look up the preferred MX host for domain
+    Not memoized across runs: RESOLVER's cache already honours TTLs, and
+    process_csv resolves each distinct domain once per run
+    Returns: (mx_host, reason) - mx_host is None when the lookup failed
+    """
     try:
-        dns.resolver.resolve(domain, 'MX')
-        return True
+        # Absolute name so the OS search list is never consulted
+        mx_records = RESOLVER.resolve(domain.rstrip('.') + '.', 'MX', search=False)
+    except dns.exception.Timeout:
+        return None, "DNS timeout"
     except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer, dns.resolver.NoNameservers, Exception):
-        return False
+        return None, "No MX record"
+    return str(min(mx_records, key=lambda record: record.preference).exchange), "Valid"
 
-def is_disposable_email(email):
-    """Check if email is from a disposable email provider"""
-    try:
-        domain = email.split('@')[1].lower()
-        return domain in DISPOSABLE_DOMAINS
-    except:
-        return False
+def resolve_mx_records(domains, max_workers=64):
+    """
+    Look up MX records for many domains concurrently
+    Returns: dict mapping domain -> (mx_host, reason) as returned by lookup_mx
+    """
+    # Sorted by reversed labels so domains under the same TLD/parent are queried
+    # together, improving upstream resolver cache locality (RESOLVER is shared)
+    domains = sorted(domains, key=lambda domain: domain.split('.')[::-1])
+    if not domains:
+        return {}
+    
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(domains))) as executor:
+        results = executor.map(lookup_mx, domains)
+        return dict(zip(domains, results))
+
+def is_disposable_domain(domain):
+    """Check if domain belongs to a disposable email provider, including subdomains"""
+    # Exact matches are the common case
+    if domain in DISPOSABLE_DOMAINS:
+        return True
+    return matches_domain_trie(domain, DISPOSABLE_TRIE)
+
+def smtp_error_reason(error):
+    """Map an exception raised during an SMTP session to a short reason"""
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return "Server disconnected"
+    if isinstance(error, smtplib.SMTPConnectError):
+        return "Connection failed"
+    if isinstance(error, socket.timeout):
+        return "Timeout"
+    return "SMTP check failed"
+
+# RFC 5321 only requires servers to accept 100 recipients per mail transaction
+MAX_RECIPIENTS_PER_TRANSACTION = 100
 
-def verify_smtp(email, timeout=10):
+def start_mail_transaction(server):
+    """Send MAIL FROM, raising if the server refuses the sender"""
+    sender = 'verify@example.com'
+    code, message = server.mail(sender)
+    if code != 250:
+        raise smtplib.SMTPSenderRefused(code, message, sender)
+
+def verify_smtp_batch(mx_host, emails, timeout=10, fail_fast_after=3):
     """
-    Verify email exists via SMTP connection
-    Returns: (is_valid, reason)
+    Verify many emails on one MX host over a single SMTP session
+    (one HELO, then one RCPT TO per email, in transactions of at most
+    MAX_RECIPIENTS_PER_TRANSACTION recipients separated by RSET/MAIL FROM)
+    Gives up on the host after fail_fast_after consecutive 4xx (temporary) replies
+    Returns: dict mapping email -> (is_valid, reason); is_valid is None when
+    the server could not give an answer
     """
+    results = {}
+    consecutive_temp_failures = 0
+    
+    # Connect to SMTP server
+    try:
+        server = smtplib.SMTP(mx_host, timeout=timeout)
+    except Exception as e:
+        reason = smtp_error_reason(e)
+        return {email: (None, reason) for email in emails}
+    
     try:
-        # Extract domain
-        domain = email.split('@')[1]
-        
-        # Get MX records
-        try:
-            mx_records = dns.resolver.resolve(domain, 'MX')
-            mx_host = str(mx_records[0].exchange)
-        except:
-            return False, "No MX record"
-        
-        # Connect to SMTP server
-        server = smtplib.SMTP(timeout=timeout)
         server.set_debuglevel(0)
-        
-        # Connect to MX host
-        server.connect(mx_host)
         server.helo(server.local_hostname)
-        server.mail('verify@example.com')
-        code, message = server.rcpt(email)
-        server.quit()
         
-        # Check response code
-        if code == 250:
-            return True, "Valid"
-        else:
-            return False, "SMTP rejected"
+        for i, email in enumerate(emails):
+            # Start a new transaction for every chunk of recipients
+            if i % MAX_RECIPIENTS_PER_TRANSACTION == 0:
+                if i > 0:
+                    server.rset()
+                start_mail_transaction(server)
             
-    except smtplib.SMTPServerDisconnected:
-        return None, "Server disconnected"
-    except smtplib.SMTPConnectError:
-        return None, "Connection failed"
-    except socket.timeout:
-        return None, "Timeout"
+            code, message = server.rcpt(email)
+            
+            # Check response code
+            if code == 250:
+                results[email] = (True, "Valid")
+                consecutive_temp_failures = 0
+            elif 400 <= code < 500:
+                # Greylisting / rate limiting: no answer for this address
+                results[email] = (None, "Temporary failure")
+                consecutive_temp_failures += 1
+                if consecutive_temp_failures >= fail_fast_after:
+                    break
+            else:
+                results[email] = (False, "SMTP rejected")
+                consecutive_temp_failures = 0
+        
+        server.quit()
     except Exception as e:
-        return None, f"SMTP check failed"
+        # Connection is unusable, so nothing more can be checked on it
+        server.close()
+        reason = smtp_error_reason(e)
+        results.update((email, (None, reason)) for email in emails if email not in results)
+    
+    # Anything not reached (fail fast) has no answer
+    results.update((email, (None, "Temporary failure")) for email in emails if email not in results)
+    
+    return results
 
-def validate_email(email, seen_emails, use_smtp=False, rate_limit_delay=1.5):
+def group_by_mx_host(emails, mx_results):
     """
-    Comprehensive email validation
-    Returns: (is_valid, reason)
+    Group emails by the MX host that handles their domain
+    mx_results: dict of domain -> (mx_host, reason) from resolve_mx_records,
+    covering every email's domain with a found MX host
+    Returns: dict mapping MX host -> list of emails
     """
-    email_str = str(email).strip().lower()
-    
-    # Check for empty or NaN
-    if pd.isna(email) or email_str == '' or email_str == 'nan':
-        return False, "Empty email"
-    
-    # Check for duplicates
-    if email_str in seen_emails:
-        return False, "Duplicate"
-    
-    # Syntax validation
-    if not validate_email_syntax(email_str):
-        return False, "Invalid syntax"
-    
-    # Check for disposable emails
-    if is_disposable_email(email_str):
-        return False, "Disposable email"
+    batches = {}
+    for email in emails:
+        mx_host, mx_reason = mx_results[email.rpartition('@')[2]]
+        batches.setdefault(mx_host, []).append(email)
+    return batches
+
+def precheck_emails(emails):
+    """
+    Vectorized empty, duplicate, syntax and disposable checks for a column of emails
+    Returns: (normalized emails, domains, reasons) - an empty reason means the row
+    passed and still needs MX/SMTP checks
+    """
+    normalized = emails.fillna('').astype(str).str.strip().str.lower()
+    domains = normalized.str.split('@', n=1).str[1]
     
-    # Extract domain
-    try:
-        domain = email_str.split('@')[1]
-    except:
-        return False, "Invalid format"
+    empty = emails.isna() | normalized.isin(['', 'nan'])
+    duplicate = normalized.duplicated()
+    syntax_ok = normalized.str.match(EMAIL_RE)
+    disposable = domains.fillna('').map(is_disposable_domain).astype(bool)
     
-    # Check MX records
-    if not check_mx_record(domain):
-        return False, "No MX record"
+    reasons = np.select(
+        [empty, duplicate, ~syntax_ok, disposable],
+        ['Empty email', 'Duplicate', 'Invalid syntax', 'Disposable email'],
+        default=''
+    )
+    return normalized, domains, pd.Series(reasons, index=emails.index)
+
+def update_progress(progress_bar, status_text, done, total, start_time, label="Processing"):
+    """Update the progress bar and the status text with an ETA"""
+    # Calculate progress
+    progress_bar.progress(done / total)
     
-    # SMTP verification (optional, slower)
-    if use_smtp:
-        time.sleep(rate_limit_delay)  # Rate limiting
-        smtp_valid, smtp_reason = verify_smtp(email_str)
-        if smtp_valid is False:
-            return False, smtp_reason
-        # If smtp_valid is None (connection error), continue without SMTP result
+    # Estimate time remaining
+    elapsed = time.time() - start_time
+    if done > 1:
+        avg_time_per_item = elapsed / done
+        remaining_items = total - done
+        eta_seconds = avg_time_per_item * remaining_items
+        eta_text = f"{label}... {done}/{total} | ETA: {eta_seconds:.1f}s"
+    else:
+        eta_text = f"{label}... {done}/{total}"
     
-    return True, "Valid"
+    status_text.text(eta_text)
 
-def process_csv(df, progress_bar, status_text, use_smtp=False):
+def process_csv(df, progress_bar, status_text, use_smtp=False, smtp_max_workers=16):
     """Process the CSV and validate emails"""
     total_rows = len(df)
-    seen_emails = set()
-    statuses = []
+    
+    # Cheap checks for the whole column at once
+    normalized, domains, reasons = precheck_emails(df['Email Address'])
+    passed = (reasons == '').to_numpy()
+    normalized = normalized.to_numpy()
+    domains = domains.to_numpy()
+    statuses = [f'Invalid ({reason})' if reason else 'Valid' for reason in reasons.tolist()]
+    
+    # Resolve MX records once per distinct domain of rows that passed, in parallel
+    # (this dict is the per-run memo for the MX check, reasons and SMTP grouping)
+    status_text.text("Resolving mail domains...")
+    mx_results = resolve_mx_records(pd.unique(domains[passed]))
+    
+    # Only rows that passed the pre-checks need per-row work
+    candidates = np.flatnonzero(passed)
+    total_candidates = len(candidates)
     
     start_time = time.time()
     
-    for idx, row in df.iterrows():
-        # Calculate progress
-        progress = (idx + 1) / total_rows
-        progress_bar.progress(progress)
+    # Refresh the UI at most ~100 times instead of on every row
+    update_every = max(1, total_candidates // 100)
+    
+    smtp_candidates = []
+    valid_count = 0
+    
+    for count, idx in enumerate(candidates):
+        done = count + 1
+        if count % update_every == 0 or done == total_candidates:
+            update_progress(progress_bar, status_text, done, total_candidates, start_time)
         
-        # Estimate time remaining
-        elapsed = time.time() - start_time
-        if idx > 0:
-            avg_time_per_row = elapsed / (idx + 1)
-            remaining_rows = total_rows - (idx + 1)
-            eta_seconds = avg_time_per_row * remaining_rows
-            smtp_status = " (with SMTP)" if use_smtp else ""
-            eta_text = f"Processing{smtp_status}... {idx + 1}/{total_rows} | ETA: {eta_seconds:.1f}s"
+        # MX check against the pre-resolved domains - no network in this loop
+        # (duplicates, syntax and disposable domains were handled by the pre-checks)
+        domain = domains[idx]
+        mx_host, mx_reason = mx_results[domain]
+        if mx_host is not None:
+            valid_count += 1
+            # SMTP is batched per MX host below
+            if domain not in ALLOWLISTED_DOMAINS:
+                smtp_candidates.append(idx)
         else:
-            eta_text = f"Processing... {idx + 1}/{total_rows}"
-        
-        status_text.text(eta_text)
+            statuses[idx] = f'Invalid ({mx_reason})'
+    
+    # SMTP verification (optional, slower) - one session per MX host, hosts in parallel
+    if use_smtp and smtp_candidates:
+        batches = group_by_mx_host(normalized[smtp_candidates].tolist(), mx_results)
+        smtp_results = {}
         
-        # Validate email
-        email = row['Email Address']
-        is_valid, reason = validate_email(email, seen_emails, use_smtp=use_smtp)
+        if batches:
+            start_time = time.time()
+            with ThreadPoolExecutor(max_workers=min(smtp_max_workers, len(batches))) as executor:
+                futures = [
+                    executor.submit(verify_smtp_batch, mx_host, host_emails)
+                    for mx_host, host_emails in batches.items()
+                ]
+                for done, future in enumerate(as_completed(futures), start=1):
+                    smtp_results.update(future.result())
+                    update_progress(progress_bar, status_text, done, len(batches), start_time, label="Verifying via SMTP")
         
-        if is_valid:
-            seen_emails.add(str(email).strip().lower())
-            statuses.append('Valid')
-        else:
-            statuses.append(f'Invalid ({reason})')
+        for idx in smtp_candidates:
+            smtp_valid, smtp_reason = smtp_results[normalized[idx]]
+            # If smtp_valid is None (connection error), keep the email as valid
+            if smtp_valid is False:
+                statuses[idx] = f'Invalid ({smtp_reason})'
+                valid_count -= 1
     
     # Add Status column
     df['Status'] = statuses
     
-    # Calculate stats
-    valid_count = sum(1 for s in statuses if s == 'Valid')
+    # Calculate stats (valid_count is kept up to date above)
     invalid_count = total_rows - valid_count
     
     return df, valid_count, invalid_count
 
 def create_download_zip(df):
-    """Generate a ZIP file with full results, valid emails, and invalid emails"""
+    """
+    Generate a compressed ZIP file with full results, valid emails, and invalid emails
+    (the valid/invalid files are left out when they would be empty)
+    """
     # Create a BytesIO buffer for the ZIP
     zip_buffer = BytesIO()
     
-    with ZipFile(zip_buffer, 'w') as zip_file:
+    with ZipFile(zip_buffer, 'w', compression=ZIP_DEFLATED, compresslevel=6) as zip_file:
         # Full results CSV
-        full_csv = df.to_csv(index=False)
+        full_csv = df.to_csv(index=False, lineterminator='\n')
         zip_file.writestr('full_results.csv', full_csv)
         
         # Valid emails only CSV
         valid_df = df[df['Status'] == 'Valid']
-        valid_csv = valid_df.to_csv(index=False)
-        zip_file.writestr('valid_emails.csv', valid_csv)
+        if len(valid_df) > 0:
+            valid_csv = valid_df.to_csv(index=False, lineterminator='\n')
+            zip_file.writestr('valid_emails.csv', valid_csv)
         
         # Invalid emails only CSV
         invalid_df = df[df['Status'] != 'Valid']
-        invalid_csv = invalid_df.to_csv(index=False)
-        zip_file.writestr('invalid_emails.csv', invalid_csv)
+        if len(invalid_df) > 0:
+            invalid_csv = invalid_df.to_csv(index=False, lineterminator='\n')
+            zip_file.writestr('invalid_emails.csv', invalid_csv)
     
     zip_buffer.seek(0)
     return zip_buffer
 
-def get_download_link(zip_buffer):
-    """Generate a download link for the ZIP file"""
-    b64 = base64.b64encode(zip_buffer.read()).decode()
-    return f'<a href="data:application/zip;base64,{b64}" download="email_results.zip">Download Results (ZIP)</a>'
+@st.cache_data
+def load_csv(file_bytes):
+    """Parse the uploaded CSV and keep only the required columns (cached per file contents)"""
+    df = pd.read_csv(BytesIO(file_bytes))
+    
+    # Keep only the required columns
+    required_columns = ['Name', 'Email Address', 'Mobile Number']
+    # Filter to only columns that exist in both the dataframe and required list
+    columns_to_keep = [col for col in required_columns if col in df.columns]
+    return df[columns_to_keep]
 
 # Streamlit App
 st.set_page_config(page_title="Email Cleaner", page_icon="✉️", layout="wide")
@@ -206,14 +350,9 @@ st.markdown("Upload your CSV file to validate and clean email addresses")
 uploaded_file = st.file_uploader("Choose a CSV file", type=['csv'])
 
 if uploaded_file is not None:
-    # Read CSV
-    df = pd.read_csv(uploaded_file)
-    
-    # Keep only the required columns
-    required_columns = ['Name', 'Email Address', 'Mobile Number']
-    # Filter to only columns that exist in both the dataframe and required list
-    columns_to_keep = [col for col in required_columns if col in df.columns]
-    df = df[columns_to_keep]
+    # Read CSV (parsed once per distinct file, not on every rerun)
+    file_bytes = uploaded_file.getvalue()
+    df = load_csv(file_bytes)
     
     # Validate required column exists
     if 'Email Address' not in df.columns:
@@ -227,7 +366,7 @@ if uploaded_file is not None:
         
         # SMTP verification option
         use_smtp = st.checkbox(
-            "🔍 Enable SMTP Verification (More accurate but slower - adds ~1.5s per email)",
+            "🔍 Enable SMTP Verification (More accurate but slower)",
             value=False,
             help="Connects to mail servers to verify if specific email addresses exist. This is more thorough but significantly slower."
         )
@@ -235,6 +374,9 @@ if uploaded_file is not None:
         if use_smtp:
             st.warning("⚠️ SMTP verification enabled. Processing will be significantly slower but more accurate.")
         
+        # Results are kept per upload and SMTP setting so reruns don't reprocess
+        results_key = (uploaded_file.file_id, use_smtp)
+        
         # Run validation button
         if st.button("🚀 Clean Email List", type="primary"):
             st.subheader("⚙️ Processing...")
@@ -252,32 +394,48 @@ if uploaded_file is not None:
             progress_bar.empty()
             status_text.empty()
             
+            st.session_state['results'] = {
+                'key': results_key,
+                'cleaned_df': cleaned_df,
+                'valid_count': valid_count,
+                'invalid_count': invalid_count,
+                'processing_time': processing_time,
+                'zip_bytes': create_download_zip(cleaned_df).getvalue()
+            }
+        
+        results = st.session_state.get('results')
+        if results is not None and results['key'] == results_key:
             # Show results
-            st.success(f"✅ Processing complete in {processing_time:.2f} seconds!")
+            st.success(f"✅ Processing complete in {results['processing_time']:.2f} seconds!")
             
             # Stats
             col1, col2, col3 = st.columns(3)
             with col1:
                 st.metric("Total Emails", len(df))
             with col2:
-                st.metric("Valid Emails", valid_count, delta=None)
+                st.metric("Valid Emails", results['valid_count'], delta=None)
             with col3:
-                st.metric("Removed", invalid_count, delta=f"-{invalid_count}")
+                st.metric("Removed", results['invalid_count'], delta=f"-{results['invalid_count']}")
             
             # Show preview of cleaned data
             st.subheader("📊 Preview of Cleaned Data")
-            st.dataframe(cleaned_df.head(20), use_container_width=True)
+            st.dataframe(results['cleaned_df'].head(20), use_container_width=True)
             
             # Download button
             st.subheader("💾 Download Results")
-            zip_buffer = create_download_zip(cleaned_df)
-            st.markdown(get_download_link(zip_buffer), unsafe_allow_html=True)
+            st.download_button(
+                "Download Results (ZIP)",
+                data=results['zip_bytes'],
+                file_name="email_results.zip",
+                mime="application/zip",
+                on_click="ignore"  # Download without rerunning, like the old link
+            )
             
             st.info("""
-            📦 **ZIP file contains 3 CSV files:**
+            📦 **ZIP file contains up to 3 CSV files:**
             - `full_results.csv` - All emails with Status column
-            - `valid_emails.csv` - Only valid emails
-            - `invalid_emails.csv` - Only invalid emails
+            - `valid_emails.csv` - Only valid emails (if any)
+            - `invalid_emails.csv` - Only invalid emails (if any)
             """)
 
 else:
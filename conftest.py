@@ -0,0 +1,5 @@
+# Keeps the repo root on sys.path so tests can `import app` under plain `pytest`
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
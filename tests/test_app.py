@@ -0,0 +1,157 @@
+from io import StringIO
+
+import pandas as pd
+
+import app
+
+
+class DummyWidget:
+    """Stands in for the Streamlit progress bar / status text"""
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+def run_process_csv(csv_text, **kwargs):
+    df = pd.read_csv(StringIO(csv_text))
+    return app.process_csv(df, DummyWidget(), DummyWidget(), **kwargs)
+
+
+def test_blank_email_column_is_reported_as_empty():
+    cleaned_df, valid_count, invalid_count = run_process_csv("Name,Email Address\nA,\nB,\n")
+    assert list(cleaned_df['Status']) == ['Invalid (Empty email)', 'Invalid (Empty email)']
+    assert (valid_count, invalid_count) == (0, 2)
+
+
+def test_header_only_csv_has_no_results():
+    cleaned_df, valid_count, invalid_count = run_process_csv("Name,Email Address\n")
+    assert len(cleaned_df) == 0
+    assert (valid_count, invalid_count) == (0, 0)
+
+
+class RecipientCappedSMTP:
+    """Fake SMTP server that refuses more than 100 recipients per transaction"""
+    instances = []
+
+    def __init__(self, host, timeout=None, fail_helo=False):
+        self.local_hostname = 'localhost'
+        self.recipients = 0
+        self.fail_helo = fail_helo
+        self.closed = False
+        RecipientCappedSMTP.instances.append(self)
+
+    def set_debuglevel(self, level):
+        pass
+
+    def helo(self, name):
+        if self.fail_helo:
+            raise app.smtplib.SMTPServerDisconnected()
+
+    def mail(self, sender):
+        self.recipients = 0
+        return 250, b'OK'
+
+    def rset(self):
+        self.recipients = 0
+
+    def rcpt(self, address):
+        self.recipients += 1
+        if self.recipients > 100:
+            return 452, b'Too many recipients'
+        return 250, b'OK'
+
+    def quit(self):
+        self.closed = True
+
+    def close(self):
+        self.closed = True
+
+
+def test_smtp_batch_splits_recipients_into_transactions(monkeypatch):
+    monkeypatch.setattr(app.smtplib, 'SMTP', RecipientCappedSMTP)
+    emails = [f'user{i}@example.com' for i in range(150)]
+    results = app.verify_smtp_batch('mx.example.com', emails)
+    assert all(results[email] == (True, "Valid") for email in emails)
+
+
+def test_smtp_batch_closes_connection_on_handshake_failure(monkeypatch):
+    RecipientCappedSMTP.instances.clear()
+    monkeypatch.setattr(app.smtplib, 'SMTP', lambda host, timeout=None: RecipientCappedSMTP(host, fail_helo=True))
+    results = app.verify_smtp_batch('mx.example.com', ['a@example.com'])
+    assert results == {'a@example.com': (None, "Server disconnected")}
+    assert RecipientCappedSMTP.instances[0].closed
+
+
+def test_dns_timeout_is_not_memoized(monkeypatch):
+    calls = []
+
+    def timing_out_resolve(name, rdtype, **kwargs):
+        calls.append(name)
+        raise app.dns.exception.Timeout()
+
+    monkeypatch.setattr(app.RESOLVER, 'resolve', timing_out_resolve)
+    assert app.lookup_mx('example.org') == (None, "DNS timeout")
+    assert app.lookup_mx('example.org') == (None, "DNS timeout")
+    assert len(calls) == 2
+
+
+def test_precheck_matches_disposable_domains_and_subdomains_only():
+    emails = pd.Series([
+        'a@mailinator.com',
+        'b@foo.mailinator.com',
+        'c@notmailinator.com',
+        'd@mailinator.com.example',
+    ])
+    normalized, domains, reasons = app.precheck_emails(emails)
+    assert list(reasons) == ['Disposable email', 'Disposable email', '', '']
+
+
+class ScriptedSMTP(RecipientCappedSMTP):
+    """Fake SMTP server that replies to RCPT with a per-address code (default 250)"""
+    replies = {}
+    rcpt_calls = []
+
+    def rcpt(self, address):
+        ScriptedSMTP.rcpt_calls.append(address)
+        return ScriptedSMTP.replies.get(address, 250), b''
+
+
+def test_smtp_batch_fails_fast_after_consecutive_temporary_failures(monkeypatch):
+    emails = ['t1@example.com', 't2@example.com', 'ok@example.com',
+              't3@example.com', 't4@example.com', 't5@example.com',
+              'after1@example.com', 'after2@example.com']
+    ScriptedSMTP.replies = {email: 451 for email in emails if email.startswith('t')}
+    ScriptedSMTP.rcpt_calls = []
+    monkeypatch.setattr(app.smtplib, 'SMTP', ScriptedSMTP)
+
+    results = app.verify_smtp_batch('mx.example.com', emails)
+
+    # The 250 resets the counter, so the host is only abandoned after t3..t5
+    assert ScriptedSMTP.rcpt_calls == emails[:6]
+    assert results['ok@example.com'] == (True, "Valid")
+    assert results['t1@example.com'] == (None, "Temporary failure")
+    assert results['after1@example.com'] == (None, "Temporary failure")
+    assert results['after2@example.com'] == (None, "Temporary failure")
+
+
+def test_allowlisted_domains_skip_smtp_but_still_need_mx(monkeypatch):
+    mx_hosts = {
+        'gmail.com': ('gmail-smtp-in.l.google.com.', "Valid"),
+        'hotmail.com': (None, "No MX record"),
+        'example.com': ('mx.example.com.', "Valid"),
+    }
+    monkeypatch.setattr(app, 'lookup_mx', lambda domain: mx_hosts[domain])
+    opened_hosts = []
+
+    def fake_smtp(host, timeout=None):
+        opened_hosts.append(host)
+        return RecipientCappedSMTP(host, timeout=timeout)
+
+    monkeypatch.setattr(app.smtplib, 'SMTP', fake_smtp)
+
+    cleaned_df, valid_count, invalid_count = run_process_csv(
+        "Email Address\na@gmail.com\nb@hotmail.com\nc@example.com\n", use_smtp=True
+    )
+
+    assert opened_hosts == ['mx.example.com.']
+    assert list(cleaned_df['Status']) == ['Valid', 'Invalid (No MX record)', 'Valid']
+    assert (valid_count, invalid_count) == (2, 1)